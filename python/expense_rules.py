@@ -0,0 +1,254 @@
+# Heurísticas sobre el texto OCR (sin dependencias del motor OCR).
+# Compatible con mypyc: un expense_rules*.so junto a este archivo se importa en su lugar (ver README: en desarrollo,
+# compilar fuera de python/ para no ejecutar una extensión vieja).
+import datetime
+import os
+import re
+from typing import Any, Dict, List, Tuple
+
+# All line-level fields in one alternation; order matters when several match at the same offset
+_FIELDS_PATTERN = (
+    r"(?P<amt>\d+[\.,]\d{2})"
+    # Whole digit run; scan_fields keeps it only if it is exactly 11 digits (RE2 has no lookaround)
+    r"|(?P<ruc>\d{11,})"
+    r"|(?P<date_ymd>20\d{2}[-/](?:0[1-9]|1[0-2])[-/](?:0[1-9]|[12]\d|3[01]))"  # YYYY-MM-DD
+    r"|(?P<date_dmy>(?:0[1-9]|[12]\d|3[01])[-/](?:0[1-9]|1[0-2])[-/]20\d{2})"  # DD-MM-YYYY
+    r"|(?P<num>[FB][0-9]{3}-[0-9]{5,8})"
+    r"|(?P<num_alt>[A-Z][0-9]{3}-[0-9]{5,10})"
+    r"|(?P<serie>[0-9]{3}-[0-9]{5,8})"
+    r"|(?P<total>TOTAL)"
+    r"|(?P<nl>\n)"
+)
+
+def try_compile_re2(pattern: str):
+    # google-re2 matches in linear time (no backtracking); its \d and \b are ASCII-only like re.ASCII.
+    # It bounds the worst case on untrusted text but is not faster: its Python wrapper measured 4-10x
+    # slower per scan than sre on receipts, so it is opt-in (CONTAPRO_REGEX_ENGINE=re2).
+    if (os.environ.get("CONTAPRO_REGEX_ENGINE") or "").strip().lower() != "re2":
+        return None
+    try:
+        import re2  # type: ignore
+        return re2.compile(pattern)
+    except Exception:
+        return None
+
+_RE_FIELDS = try_compile_re2(_FIELDS_PATTERN) or re.compile(_FIELDS_PATTERN, re.ASCII)
+_RE_SAC = re.compile(r"SAC|SA|SRL|EIRL|S\.A\.|S\.A\.C", re.ASCII)
+
+# Keyword tables in priority order: the first label with any hit wins
+_CATEGORIAS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("alimentación", ("rest", "pollo", "pizza", "sandwich", "bembos", "kfc", "comida", "market", "super")),
+    ("transporte", ("uber", "taxi", "bus", "peaje", "gasolina", "shell", "grif")),
+    ("servicios", ("luz", "agua", "internet", "claro", "movistar", "servicio")),
+    ("entretenimiento", ("cine", "netflix", "spotify", "pub", "bar")),
+    ("educación", ("colegio", "universidad", "curso", "libro")),
+    ("salud", ("farmacia", "clinica", "salud", "medic")),
+    ("vivienda", ("alquiler", "inmobiliaria", "hogar", "vivienda")),
+    ("tecnología", ("laptop", "pc", "celular", "iphone", "samsung", "tecnolog")),
+)
+_MONEDAS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("PEN", ("PEN", "S/")),
+    ("USD", ("USD", "US$", "$")),
+)
+
+def try_build_automaton(table: Tuple[Tuple[str, Tuple[str, ...]], ...]):
+    # pyahocorasick: one pass over the text for all keywords instead of one `in` per keyword
+    try:
+        import ahocorasick  # type: ignore
+    except Exception:
+        return None
+    automaton = ahocorasick.Automaton()
+    for rank, (_, keywords) in enumerate(table):
+        for kw in keywords:
+            if not automaton.exists(kw):
+                automaton.add_word(kw, rank)
+    automaton.make_automaton()
+    return automaton
+
+_AC_CATEGORIAS = try_build_automaton(_CATEGORIAS)
+_AC_MONEDAS = try_build_automaton(_MONEDAS)
+
+def match_label(table: Tuple[Tuple[str, Tuple[str, ...]], ...], automaton, text: str) -> str:
+    if automaton is None:
+        for label, keywords in table:
+            if any(k in text for k in keywords):
+                return label
+        return ""
+    best = len(table)
+    for _, rank in automaton.iter(text):
+        if rank < best:
+            best = rank
+            if best == 0:
+                break
+    return table[best][0] if best < len(table) else ""
+
+def clean_text(lines: List[str]) -> List[str]:
+    cleaned = []
+    for ln in lines:
+        # strip + unify spaces (split() already drops leading/trailing whitespace)
+        t = " ".join(ln.split())
+        if not t:
+            continue
+        cleaned.append(t)
+    return cleaned
+
+def detect_tipo(joined_lower: str) -> str:
+    if "factura" in joined_lower:
+        return "factura"
+    if "boleta" in joined_lower or "ticket" in joined_lower:
+        return "boleta"
+    return ""
+
+def detect_moneda(joined_upper: str) -> str:
+    return match_label(_MONEDAS, _AC_MONEDAS, joined_upper)
+
+def starts_digit_run(text: str, pos: int) -> bool:
+    return pos == 0 or not text[pos - 1].isdigit()
+
+def scan_fields(joined_upper: str) -> Dict[str, str]:
+    # Un solo recorrido con el patrón combinado sobre las líneas unidas con "\n"; "nl" delimita las líneas
+    ruc = fecha = serie = ""
+    num = num_alt = ""
+    num_line = num_alt_line = -1
+    # Amounts kept as integer cents: "\d+[.,]\d{2}" always ends in separator + 2 digits
+    max_cents = 0
+    total_cents = -1
+    line_no = 0
+    line_total = False
+    line_cents = -1
+    for m in _RE_FIELDS.finditer(joined_upper):
+        kind = m.lastgroup
+        t = m.group()
+        if kind == "amt":
+            line_cents = int(t[:-3]) * 100 + int(t[-2:])
+            if line_cents > max_cents:
+                max_cents = line_cents
+            # "20100070970.50": the amount alternative took an 11-digit run first
+            if not ruc and len(t) == 14 and starts_digit_run(joined_upper, m.start()):
+                ruc = t[:11]
+        elif kind == "nl":
+            # Prefer amount on the (last) TOTAL line
+            if line_total and line_cents >= 0:
+                total_cents = line_cents
+            line_no += 1
+            line_total = False
+            line_cents = -1
+        elif kind == "total":
+            line_total = True
+        elif kind == "ruc":
+            # OCR often glues the label ("RUC20100070970"), so no \b; only reject runs glued to other digits
+            if not ruc and len(t) == 11 and starts_digit_run(joined_upper, m.start()):
+                ruc = t
+        elif kind == "date_ymd":
+            if not fecha:
+                fecha = f"{t[0:4]}-{t[5:7]}-{t[8:10]}"
+        elif kind == "date_dmy":
+            if not fecha:
+                fecha = f"{t[6:10]}-{t[3:5]}-{t[0:2]}"
+        elif kind == "num":
+            if not num:
+                num, num_line = t, line_no
+        elif kind == "num_alt":
+            if not num_alt:
+                num_alt, num_alt_line = t, line_no
+        elif kind == "serie":
+            if not serie:
+                serie = t
+    if line_total and line_cents >= 0:
+        total_cents = line_cents
+    # F/B series win over other letters on the same line; 001-12345 is the fallback
+    if num and (not num_alt or num_line <= num_alt_line):
+        numero = num
+    else:
+        numero = num_alt or serie
+    # total_source: "line" (amount on a TOTAL line), "max" (largest amount seen) or ""
+    total_source = "line" if total_cents >= 0 else ""
+    if total_cents < 0 and max_cents > 0:
+        total_cents = max_cents
+        total_source = "max"
+    total_amt = f"{total_cents // 100}.{total_cents % 100:02d}" if total_cents >= 0 else ""
+    return {"ruc": ruc, "fecha": fecha, "total": total_amt, "total_source": total_source, "numero": numero}
+
+def detect_proveedor(lines: List[str]) -> Tuple[str, bool]:
+    # Devuelve (proveedor, True si salió de la razón social SAC/SRL/EIRL; False si es sólo la línea previa al RUC)
+    # Heurística: primera línea en mayúsculas que parece nombre comercial
+    for ln in lines[:8]:
+        t = ln.strip()
+        if len(t) < 3:
+            continue
+        if _RE_SAC.search(t.upper()):
+            return t, True
+    # Otra heurística: línea cerca de RUC
+    for i, ln in enumerate(lines):
+        if "RUC" in ln.upper() and i > 0:
+            prev = lines[i-1].strip()
+            if len(prev) > 3:
+                return prev, False
+    return "", False
+
+def detect_categoria(joined_lower: str) -> str:
+    return match_label(_CATEGORIAS, _AC_CATEGORIAS, joined_lower)
+
+_RUC_WEIGHTS = (5, 4, 3, 2, 7, 6, 5, 4, 3, 2)
+_RUC_PREFIXES = ("10", "15", "17", "20")
+
+def ruc_valid(ruc: str) -> bool:
+    # Dígito verificador SUNAT (módulo 11) sobre los 10 primeros dígitos
+    if len(ruc) != 11 or not ruc.isdigit() or ruc[:2] not in _RUC_PREFIXES:
+        return False
+    total = 0
+    for i in range(10):
+        total += int(ruc[i]) * _RUC_WEIGHTS[i]
+    check = 11 - total % 11
+    if check == 10:
+        check = 0
+    elif check == 11:
+        check = 1
+    return check == int(ruc[10])
+
+def date_valid(fecha: str) -> bool:
+    # fecha ya viene como YYYY-MM-DD; descarta días inexistentes (31/02)
+    try:
+        datetime.date(int(fecha[0:4]), int(fecha[5:7]), int(fecha[8:10]))
+    except ValueError:
+        return False
+    return True
+
+def score_confidence(result: Dict[str, Any], total_source: str, proveedor_by_suffix: bool) -> float:
+    # Obligatorios: RUC con dígito verificador válido y total > 0 tomado de una línea TOTAL (el mayor monto
+    # suele ser el efectivo entregado). Sin ellos 0.0; con ellos, fracción de campos críticos verificables.
+    if not ruc_valid(result["ruc_proveedor"]):
+        return 0.0
+    if total_source != "line" or result["monto_total"] in ("", "0.00"):
+        return 0.0
+    checks = (
+        True,
+        True,
+        bool(result["fecha_emision"]) and date_valid(result["fecha_emision"]),
+        bool(result["numero_documento"]),
+        # "La línea antes del RUC" casi siempre existe; sólo cuenta la razón social reconocida
+        proveedor_by_suffix,
+    )
+    return sum(1 for ok in checks if ok) / len(checks)
+
+def extract_fields(lines: List[str]) -> Dict[str, Any]:
+    joined = "\n".join(lines)
+    joined_lower = joined.lower()
+    joined_upper = joined.upper()
+    fields = scan_fields(joined_upper)
+    proveedor, proveedor_by_suffix = detect_proveedor(lines)
+    result: Dict[str, Any] = {
+        "tipo_documento": detect_tipo(joined_lower),
+        "proveedor": proveedor,
+        "ruc_proveedor": fields["ruc"],
+        "fecha_emision": fields["fecha"],
+        "monto_total": fields["total"],
+        "moneda": detect_moneda(joined_upper),
+        "categoria_gasto": detect_categoria(joined_lower),
+        "numero_documento": fields["numero"],
+        "items": [],
+        "observaciones": "",
+        "text": " \n ".join(lines),
+    }
+    result["confidence"] = score_confidence(result, fields["total_source"], proveedor_by_suffix)
+    return result
@@ -1,8 +1,44 @@
 #!/usr/bin/env python
 import sys
+import glob
 import json
-import re
-from typing import List, Tuple
+import os
+from typing import Any, Dict, List, Tuple
+
+# Heurísticas de texto; si existe el módulo compilado con mypyc (.so) Python lo carga antes que el .py
+from expense_rules import clean_text, extract_fields
+
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
+
+def dumps(obj: Any) -> bytes:
+    # UTF-8 JSON without ASCII escaping; orjson when installed
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+def emit(data: bytes) -> None:
+    # One JSON document per stdout line, flushed (daemon protocol)
+    sys.stdout.buffer.write(data + b"\n")
+    sys.stdout.buffer.flush()
+
+EMPTY_RESULT: Dict[str, Any] = {
+    "tipo_documento": "",
+    "proveedor": "",
+    "ruc_proveedor": "",
+    "fecha_emision": "",
+    "monto_total": "",
+    "moneda": "",
+    "categoria_gasto": "",
+    "numero_documento": "",
+    "items": [],
+    "observaciones": "",
+    "text": "",
+    "confidence": 0.0
+}
+_EMPTY_BYTES = dumps(EMPTY_RESULT)
 
 def try_import_rapidocr():
     try:
@@ -11,193 +47,142 @@ def try_import_rapidocr():
     except Exception:
         return None
 
-def ocr_with_rapidocr(img_path: str) -> List[str]:
-    RapidOCR = try_import_rapidocr()
-    if RapidOCR is None:
-        return []
+def cuda_available() -> bool:
+    # Only onnxruntime-gpu exposes the CUDA provider
     try:
-        engine = RapidOCR()
-        result, _ = engine(img_path)
-        lines = [r[1][0] for r in result] if result else []
-        return lines
+        import onnxruntime  # type: ignore
+        return "CUDAExecutionProvider" in onnxruntime.get_available_providers()
     except Exception:
-        return []
+        return False
 
-def clean_text(lines: List[str]) -> List[str]:
-    cleaned = []
-    for ln in lines:
-        t = ln.strip()
-        if not t:
-            continue
-        # unify spaces
-        t = re.sub(r"\s+", " ", t)
-        cleaned.append(t)
-    return cleaned
-
-def detect_tipo(lines: List[str]) -> str:
-    joined = " ".join(lines).lower()
-    if "factura" in joined:
-        return "factura"
-    if "boleta" in joined or "ticket" in joined:
-        return "boleta"
-    return ""
+def find_model(models_dir: str, pattern: str) -> str:
+    matches = sorted(glob.glob(os.path.join(models_dir, pattern)))
+    return matches[0] if matches else ""
+
+# Recognizer dictionaries (ppocr_keys_v1.txt, ppocrv5_dict.txt); any other .txt (README, LICENSE) is ignored
+KEYS_PATTERNS = ("*keys*.txt", "*dict*.txt")
 
-def detect_fecha(lines: List[str]) -> str:
-    patterns = [
-        r"(20\d{2})[-/](0[1-9]|1[0-2])[-/](0[1-9]|[12]\d|3[01])",  # YYYY-MM-DD
-        r"(0[1-9]|[12]\d|3[01])[-/](0[1-9]|1[0-2])[-/](20\d{2})",  # DD-MM-YYYY
-    ]
-    for ln in lines:
-        for p in patterns:
-            m = re.search(p, ln)
-            if m:
-                g = m.groups()
-                if len(g) == 3 and len(g[0]) == 4:  # YYYY MM DD
-                    return f"{g[0]}-{g[1]}-{g[2]}"
-                # DD MM YYYY
-                return f"{g[2]}-{g[1]}-{g[0]}"
+def find_keys(models_dir: str) -> str:
+    # CONTAPRO_OCR_KEYS_PATH wins over whatever is in the models directory
+    explicit = (os.environ.get("CONTAPRO_OCR_KEYS_PATH") or "").strip()
+    if explicit:
+        return explicit
+    for pattern in KEYS_PATTERNS:
+        keys_path = find_model(models_dir, pattern)
+        if keys_path:
+            return keys_path
     return ""
 
-def normalize_amount(txt: str) -> str:
-    # replace thousand separators and use dot as decimal
-    t = txt.replace(" ", "")
-    t = t.replace("S/", "").replace("US$", "").replace("$", "")
-    t = t.replace(",", ".")
-    m = re.findall(r"\d+\.?\d{0,2}", t)
-    if not m:
-        return ""
+def engine_kwargs() -> Dict[str, Any]:
+    kwargs: Dict[str, Any] = {}
+    # CONTAPRO_OCR_MODELS_DIR: directory with replacement ONNX models (e.g. PP-OCRv5 det/rec/cls)
+    models_dir = (os.environ.get("CONTAPRO_OCR_MODELS_DIR") or "").strip()
+    if models_dir:
+        for kind in ("det", "cls", "rec"):
+            model_path = find_model(models_dir, f"*{kind}*.onnx")
+            if model_path:
+                kwargs[f"{kind}_model_path"] = model_path
+        keys_path = find_keys(models_dir)
+        if keys_path and "rec_model_path" in kwargs:
+            kwargs["rec_keys_path"] = keys_path
+    # CONTAPRO_OCR_DEVICE: auto (CUDA when available), cuda or cpu
+    device = (os.environ.get("CONTAPRO_OCR_DEVICE") or "auto").strip().lower()
+    if device == "cuda" or (device == "auto" and cuda_available()):
+        kwargs.update(det_use_cuda=True, cls_use_cuda=True, rec_use_cuda=True)
+    # CONTAPRO_OCR_THREADS: ONNX Runtime intra-op threads per session; keep workers x threads <= cores
+    threads = (os.environ.get("CONTAPRO_OCR_THREADS") or "").strip()
+    if threads.isdigit() and int(threads) > 0:
+        kwargs["intra_op_num_threads"] = int(threads)
+    return kwargs
+
+def create_engine():
+    RapidOCR = try_import_rapidocr()
+    if RapidOCR is None:
+        return None
     try:
-        amt = float(m[-1])
-        return f"{amt:.2f}"
+        return RapidOCR(**engine_kwargs())
     except Exception:
-        return ""
-
-def detect_moneda(lines: List[str]) -> str:
-    joined = " ".join(lines).upper()
-    if "PEN" in joined or "S/" in joined:
-        return "PEN"
-    if "USD" in joined or "US$" in joined or "$" in joined:
-        return "USD"
-    return ""
+        pass
+    # e.g. CUDA provider present but cuDNN missing: fall back to the default CPU engine
+    try:
+        return RapidOCR()
+    except Exception:
+        return None
 
-def detect_total(lines: List[str]) -> str:
-    # Prefer amount near TOTAL word; fallback to max amount seen
-    max_amt = 0.0
-    total_amt = ""
-    for ln in lines:
-        ln_up = ln.upper()
-        numbers = re.findall(r"\d+[\.,]\d{2}", ln)
-        if numbers:
-            for n in numbers:
-                try:
-                    v = float(n.replace(",", "."))
-                    if v > max_amt:
-                        max_amt = v
-                except Exception:
-                    pass
-        if "TOTAL" in ln_up:
-            # try amount on this line
-            if numbers:
-                total_amt = normalize_amount(numbers[-1])
-    if total_amt:
-        return total_amt
-    if max_amt > 0:
-        return f"{max_amt:.2f}"
-    return ""
+def warm_up(engine) -> None:
+    # First inference pays ONNX Runtime allocation/graph setup; do it before real documents
+    if engine is None:
+        return
+    try:
+        import numpy as np  # type: ignore
+        engine(np.zeros((64, 64, 3), dtype=np.uint8))
+    except Exception:
+        pass
 
-def detect_ruc(lines: List[str]) -> str:
-    for ln in lines:
-        m = re.search(r"(RUC\s*[:#]?\s*)?(\d{11})", ln.upper())
-        if m:
-            return m.group(2)
-    return ""
+def load_image(img_path: str) -> Any:
+    # Decoded BGR array when OpenCV is available; RapidOCR also accepts the path itself
+    try:
+        import cv2  # type: ignore
+        img = cv2.imread(img_path)
+        return img if img is not None else img_path
+    except Exception:
+        return img_path
 
-def detect_numero(lines: List[str]) -> str:
-    for ln in lines:
-        m = re.search(r"([FB][0-9]{3}-[0-9]{5,8})", ln.upper())
-        if m:
-            return m.group(1)
-        m2 = re.search(r"([A-Z][0-9]{3}-[0-9]{5,10})", ln.upper())
-        if m2:
-            return m2.group(1)
-    # fallback: series like 001-12345
-    for ln in lines:
-        m = re.search(r"([0-9]{3}-[0-9]{5,8})", ln)
-        if m:
-            return m.group(1)
-    return ""
+def row_text(row: Any) -> str:
+    # rapidocr_onnxruntime rows are [box, text, score]; older PaddleOCR-style rows are [box, (text, score)].
+    # Indexing row[1][0] unconditionally kept only the first character of every rapidocr line.
+    return row[1] if isinstance(row[1], str) else row[1][0]
 
-def detect_proveedor(lines: List[str]) -> str:
-    # Heurística: primera línea en mayúsculas que parece nombre comercial
-    for ln in lines[:8]:
-        t = ln.strip()
-        if len(t) < 3:
-            continue
-        if re.search(r"SAC|SA|SRL|EIRL|S\.A\.|S\.A\.C", t.upper()):
-            return t
-    # Otra heurística: línea cerca de RUC
-    for i, ln in enumerate(lines):
-        if "RUC" in ln.upper() and i > 0:
-            prev = lines[i-1].strip()
-            if len(prev) > 3:
-                return prev
-    return ""
+def ocr_with_rapidocr(img: Any, engine=None) -> List[str]:
+    if engine is None:
+        engine = create_engine()
+    if engine is None:
+        return []
+    try:
+        result, _ = engine(img)
+        return [row_text(r) for r in result] if result else []
+    except Exception:
+        return []
 
-def detect_categoria(lines: List[str]) -> str:
-    joined = " ".join(lines).lower()
-    if any(k in joined for k in ["rest", "pollo", "pizza", "sandwich", "bembos", "kfc", "comida", "market", "super"]):
-        return "alimentación"
-    if any(k in joined for k in ["uber", "taxi", "bus", "peaje", "gasolina", "shell", "grif"]):
-        return "transporte"
-    if any(k in joined for k in ["luz", "agua", "internet", "claro", "movistar", "servicio"]):
-        return "servicios"
-    if any(k in joined for k in ["cine", "netflix", "spotify", "pub", "bar"]):
-        return "entretenimiento"
-    if any(k in joined for k in ["colegio", "universidad", "curso", "libro"]):
-        return "educación"
-    if any(k in joined for k in ["farmacia", "clinica", "salud", "medic"]):
-        return "salud"
-    if any(k in joined for k in ["alquiler", "inmobiliaria", "hogar", "vivienda"]):
-        return "vivienda"
-    if any(k in joined for k in ["laptop", "pc", "celular", "iphone", "samsung", "tecnolog"]):
-        return "tecnología"
-    return ""
+def extract(img: Any, engine=None) -> Dict[str, Any]:
+    lines = ocr_with_rapidocr(img, engine)
+    return extract_fields(clean_text(lines))
+
+def parse_request(line: str) -> Tuple[Any, str]:
+    # {"id": ..., "path": ...} from the Node pool; a bare path (manual use) gets id None
+    try:
+        req = json.loads(line)
+        return req.get("id"), str(req.get("path") or "")
+    except (ValueError, AttributeError):
+        return None, line
+
+def serve():
+    # Daemon mode: one engine per process, one request per stdin line, one JSON per stdout line.
+    # The reply echoes the request id so the pool can tell it apart from stray output.
+    engine = create_engine()
+    warm_up(engine)
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        req_id, img_path = parse_request(line)
+        try:
+            result = extract(load_image(img_path), engine)
+        except Exception as e:
+            result = dict(EMPTY_RESULT, observaciones=f"ocr error: {e}")
+        result["id"] = req_id
+        emit(dumps(result))
 
 def main():
+    if os.environ.get("CONTAPRO_DAEMON"):
+        serve()
+        sys.exit(0)
     if len(sys.argv) < 2:
-        print(json.dumps({
-            "tipo_documento": "",
-            "proveedor": "",
-            "ruc_proveedor": "",
-            "fecha_emision": "",
-            "monto_total": "",
-            "moneda": "",
-            "categoria_gasto": "",
-            "numero_documento": "",
-            "items": [],
-            "observaciones": "",
-            "text": ""
-        }))
+        emit(_EMPTY_BYTES)
         sys.exit(0)
-    img_path = sys.argv[1]
-    lines = ocr_with_rapidocr(img_path)
-    lines = clean_text(lines)
-    joined = " \n ".join(lines)
-    result = {
-        "tipo_documento": detect_tipo(lines),
-        "proveedor": detect_proveedor(lines),
-        "ruc_proveedor": detect_ruc(lines),
-        "fecha_emision": detect_fecha(lines),
-        "monto_total": detect_total(lines),
-        "moneda": detect_moneda(lines),
-        "categoria_gasto": detect_categoria(lines),
-        "numero_documento": detect_numero(lines),
-        "items": [],
-        "observaciones": "",
-        "text": joined,
-    }
-    print(json.dumps(result, ensure_ascii=False))
+    result = extract(load_image(sys.argv[1]))
+    emit(dumps(result))
     sys.exit(0)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -2,10 +2,13 @@
 import sys
 import json
 import base64
+import hashlib
 import os
+import sqlite3
+import time
 
 try:
-    from openai import OpenAI
+    from openai import APIConnectionError, InternalServerError, OpenAI, RateLimitError
 except Exception as e:
     print(json.dumps({
         "tipo_documento": "",
@@ -22,6 +25,41 @@ except Exception as e:
     }))
     sys.exit(0)
 
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
+
+def dumps(obj) -> bytes:
+    # UTF-8 JSON without ASCII escaping; orjson when installed
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+def loads(text: str):
+    return orjson.loads(text) if orjson is not None else json.loads(text)
+
+def emit(data: bytes) -> None:
+    # One JSON document per stdout line, flushed (daemon protocol)
+    sys.stdout.buffer.write(data + b"\n")
+    sys.stdout.buffer.flush()
+
+EMPTY_RESULT = {
+    "tipo_documento": "",
+    "proveedor": "",
+    "ruc_proveedor": "",
+    "fecha_emision": "",
+    "monto_total": "",
+    "moneda": "",
+    "categoria_gasto": "",
+    "numero_documento": "",
+    "items": [],
+    "observaciones": ""
+}
+_EMPTY_BYTES = dumps(EMPTY_RESULT)
+
+_client = None
+
 PROMPT = (
     "Eres una IA experta en análisis de documentos financieros, especializada en facturas y boletas de venta.\n"
     "Recibirás una imagen o texto extraído de una factura o boleta, y tu tarea es identificar y estructurar la información clave de manera precisa y estandarizada.\n\n"
@@ -84,33 +122,107 @@ SCHEMA = {
     "additionalProperties": False
 }
 
-def main():
-    if len(sys.argv) < 2:
-        print(json.dumps({
-            "tipo_documento": "",
-            "proveedor": "",
-            "ruc_proveedor": "",
-            "fecha_emision": "",
-            "monto_total": "",
-            "moneda": "",
-            "categoria_gasto": "",
-            "numero_documento": "",
-            "items": [],
-            "observaciones": ""
-        }))
+def cache_key(img_bytes: bytes, model: str) -> str:
+    # Same image + model + prompt => same answer (temperature 0)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(model.encode('utf-8'))
+    h.update(PROMPT.encode('utf-8'))
+    h.update(img_bytes)
+    return h.hexdigest()
+
+def open_cache():
+    # CONTAPRO_LLM_CACHE: ruta del archivo sqlite; sin definir => sin caché
+    path = (os.environ.get('CONTAPRO_LLM_CACHE') or '').strip()
+    if not path:
+        return None
+    try:
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE IF NOT EXISTS c (k TEXT PRIMARY KEY, json TEXT NOT NULL)")
+        return conn
+    except Exception:
+        return None
+
+def cache_get(cache, key: str):
+    if cache is None:
+        return None
+    try:
+        row = cache.execute("SELECT json FROM c WHERE k=?", (key,)).fetchone()
+        return row[0] if row else None
+    except Exception:
+        return None
+
+def cache_put(cache, key: str, text: str) -> None:
+    if cache is None:
         return
+    try:
+        # sólo respuestas completas: un objeto con todos los campos requeridos del schema (no "{}" ni rechazos)
+        parsed = loads(text)
+        if not isinstance(parsed, dict) or any(k not in parsed for k in SCHEMA["required"]):
+            return
+        cache.execute("INSERT OR REPLACE INTO c (k, json) VALUES (?, ?)", (key, text))
+        cache.commit()
+    except Exception:
+        pass
 
-    img_path = sys.argv[1]
+MIME_TYPES = {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png', '.webp': 'image/webp'}
+
+def image_mime(img_path: str) -> str:
+    # El backend ya redimensiona y codifica a JPEG con sharp; aquí sólo se envían los bytes tal cual
+    return MIME_TYPES.get(os.path.splitext(img_path)[1].lower(), 'image/png')
+
+ATTEMPT_TIMEOUT = 30.0
+MAX_ATTEMPTS = 6
+DEFAULT_BUDGET_MS = 120000
+
+def get_client():
+    # Un cliente por proceso: en modo daemon reutiliza el pool de conexiones HTTP/TLS entre documentos.
+    # Sin reintentos internos: create_completion los hace dentro del plazo del pool de Node.
+    global _client
+    if _client is None:
+        _client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'), max_retries=0, timeout=ATTEMPT_TIMEOUT)
+    return _client
+
+def retry_delay(err, attempt: int) -> float:
+    # Retry-After del servidor si viene; si no, backoff exponencial 0.5s, 1s, 2s... hasta 8s
+    headers = getattr(getattr(err, 'response', None), 'headers', None) or {}
+    try:
+        retry_after = float(headers.get('retry-after') or 0)
+    except ValueError:
+        retry_after = 0.0
+    if retry_after > 0:
+        return retry_after
+    return min(0.5 * 2 ** attempt, 8.0)
+
+def create_completion(budget_ms: float, **kwargs):
+    # Reintenta timeouts, errores de conexión, 429 y 5xx, pero nunca más allá de budget_ms: el pool de Node
+    # mata el proceso al vencer su plazo y se perdería el cliente caliente. Se deja un margen del 10%.
+    deadline = time.monotonic() + max(1.0, budget_ms / 1000.0 * 0.9)
+    for attempt in range(MAX_ATTEMPTS):
+        remaining = deadline - time.monotonic()
+        try:
+            return get_client().chat.completions.create(timeout=min(ATTEMPT_TIMEOUT, remaining), **kwargs)
+        except (APIConnectionError, RateLimitError, InternalServerError) as e:
+            delay = retry_delay(e, attempt)
+            if attempt + 1 >= MAX_ATTEMPTS or time.monotonic() + delay + 1.0 >= deadline:
+                raise
+            time.sleep(delay)
+
+def extract(img_path: str, cache=None, budget_ms: float = DEFAULT_BUDGET_MS) -> str:
     with open(img_path, 'rb') as f:
-        b64 = base64.b64encode(f.read()).decode('utf-8')
-    data_url = f"data:image/png;base64,{b64}"
+        img_bytes = f.read()
 
-    api_key = os.environ.get('OPENAI_API_KEY')
     model = (os.environ.get('OPENAI_MODEL') or 'gpt-4o-mini').strip()
-    client = OpenAI(api_key=api_key)
+    key = cache_key(img_bytes, model)
+    cached = cache_get(cache, key)
+    if cached is not None:
+        return cached
+
+    b64 = base64.b64encode(img_bytes).decode('utf-8')
+    data_url = f"data:{image_mime(img_path)};base64,{b64}"
 
     try:
-        resp = client.chat.completions.create(
+        resp = create_completion(
+            budget_ms,
             model=model,
             messages=[{
                 "role": "user",
@@ -129,23 +241,49 @@ def main():
                 },
             },
         )
-        text = resp.choices[0].message.content or "{}"
-        # devolver tal cual; el wrapper Node hará JSON.parse
-        print(text)
+        content = resp.choices[0].message.content
+        if content:
+            cache_put(cache, key, content)
+        # devolver tal cual ("{}" si vino vacío: no se cachea y se reintenta en la próxima subida)
+        return content or "{}"
     except Exception as e:
-        print(json.dumps({
-            "tipo_documento": "",
-            "proveedor": "",
-            "ruc_proveedor": "",
-            "fecha_emision": "",
-            "monto_total": "",
-            "moneda": "",
-            "categoria_gasto": "",
-            "numero_documento": "",
-            "items": [],
-            "observaciones": "",
-            "error": f"llm error: {e}"
-        }))
+        return dumps(dict(EMPTY_RESULT, error=f"llm error: {e}")).decode('utf-8')
+
+def parse_request(line: str):
+    # {"id": ..., "path": ..., "timeout_ms": ...} from the Node pool; a bare path (manual use) gets id None
+    try:
+        req = json.loads(line)
+        timeout_ms = req.get('timeout_ms')
+        return req.get('id'), str(req.get('path') or ''), float(timeout_ms if timeout_ms is not None else DEFAULT_BUDGET_MS)
+    except (ValueError, TypeError, AttributeError):
+        return None, line, DEFAULT_BUDGET_MS
+
+def serve():
+    # Daemon mode: one request per stdin line, one JSON per stdout line echoing the request id
+    cache = open_cache()
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        req_id, img_path, budget_ms = parse_request(line)
+        try:
+            # re-serialize so a pretty-printed model answer still fits on one line
+            result = loads(extract(img_path, cache, budget_ms))
+        except Exception as e:
+            result = dict(EMPTY_RESULT, error=f"llm error: {e}")
+        if not isinstance(result, dict):
+            result = dict(EMPTY_RESULT, error="llm error: respuesta no es un objeto JSON")
+        result['id'] = req_id
+        emit(dumps(result))
+
+def main():
+    if os.environ.get('CONTAPRO_DAEMON'):
+        serve()
+        return
+    if len(sys.argv) < 2:
+        emit(_EMPTY_BYTES)
+        return
+    emit(extract(sys.argv[1], open_cache()).encode('utf-8'))
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
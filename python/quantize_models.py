@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# Cuantiza los modelos ONNX del OCR a INT8 para usarlos con CONTAPRO_OCR_MODELS_DIR.
+#
+#   python quantize_models.py OUT_DIR [--calib CARPETA_DE_IMAGENES]
+#
+# - rec: cuantización dinámica de los MatMul (pesos INT8, sin calibración).
+# - det: cuantización estática (QDQ) calibrada con imágenes reales; sólo si se pasa --calib.
+# - cls y los modelos no cuantizados siguen usando el modelo por defecto.
+# Los modelos de origen se toman de CONTAPRO_OCR_MODELS_DIR o, si no está definido, de rapidocr_onnxruntime.
+import sys
+import glob
+import os
+from typing import Iterator, List, Optional
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+# Same recognizer dictionary names extract_expense.py looks for
+KEYS_PATTERNS = ("*keys*.txt", "*dict*.txt")
+
+def source_dir() -> str:
+    models_dir = (os.environ.get("CONTAPRO_OCR_MODELS_DIR") or "").strip()
+    if models_dir:
+        return models_dir
+    import rapidocr_onnxruntime  # type: ignore
+    return os.path.join(os.path.dirname(rapidocr_onnxruntime.__file__), "models")
+
+def find_model(models_dir: str, kind: str) -> str:
+    matches = sorted(p for p in glob.glob(os.path.join(models_dir, f"*{kind}*.onnx")) if not p.endswith("_int8.onnx"))
+    return matches[0] if matches else ""
+
+def int8_path(out_dir: str, model_path: str) -> str:
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    return os.path.join(out_dir, f"{stem}_int8.onnx")
+
+def quantize_rec(model_path: str, out_dir: str) -> str:
+    from onnxruntime.quantization import QuantType, quantize_dynamic  # type: ignore
+    out_path = int8_path(out_dir, model_path)
+    quantize_dynamic(model_path, out_path, op_types_to_quantize=["MatMul"], weight_type=QuantType.QInt8)
+    return out_path
+
+def calibration_inputs(images_dir: str, input_name: str) -> Iterator[dict]:
+    import cv2  # type: ignore
+    from rapidocr_onnxruntime.ch_ppocr_det.utils import DetPreProcess  # type: ignore
+    # Same resize/normalization the detector applies at inference time
+    preprocess = DetPreProcess(limit_side_len=736, limit_type="min")
+    for path in sorted(glob.glob(os.path.join(images_dir, "*"))):
+        if not path.lower().endswith(IMAGE_EXTS):
+            continue
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        tensor = preprocess(img)
+        if tensor is not None:
+            yield {input_name: tensor}
+
+def quantize_det(model_path: str, out_dir: str, images_dir: str) -> Optional[str]:
+    import onnxruntime  # type: ignore
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static  # type: ignore
+
+    input_name = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    samples = list(calibration_inputs(images_dir, input_name))
+    if not samples:
+        print(f"det: no hay imágenes de calibración en {images_dir}", file=sys.stderr)
+        return None
+
+    class Reader(CalibrationDataReader):
+        def __init__(self, items: List[dict]):
+            self.items = iter(items)
+
+        def get_next(self):
+            return next(self.items, None)
+
+    out_path = int8_path(out_dir, model_path)
+    quantize_static(
+        model_path,
+        out_path,
+        Reader(samples),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+    )
+    return out_path
+
+def main():
+    if len(sys.argv) < 2:
+        print("uso: python quantize_models.py OUT_DIR [--calib CARPETA_DE_IMAGENES]", file=sys.stderr)
+        sys.exit(2)
+    out_dir = sys.argv[1]
+    calib_dir = sys.argv[sys.argv.index("--calib") + 1] if "--calib" in sys.argv[2:-1] else ""
+    os.makedirs(out_dir, exist_ok=True)
+    src = source_dir()
+
+    rec_path = find_model(src, "rec")
+    if rec_path:
+        print(f"rec: {quantize_rec(rec_path, out_dir)}")
+    det_path = find_model(src, "det")
+    if det_path and calib_dir:
+        out_path = quantize_det(det_path, out_dir, calib_dir)
+        if out_path:
+            print(f"det: {out_path}")
+    for keys_path in {p for pattern in KEYS_PATTERNS for p in glob.glob(os.path.join(src, pattern))}:
+        # Keep the recognizer dictionary next to the quantized model
+        with open(keys_path, "rb") as f_in, open(os.path.join(out_dir, os.path.basename(keys_path)), "wb") as f_out:
+            f_out.write(f_in.read())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from expense_rules import clean_text, extract_fields, ruc_valid  # noqa: E402
+
+FIELDS = ("tipo_documento", "proveedor", "ruc_proveedor", "fecha_emision", "monto_total", "moneda", "categoria_gasto", "numero_documento")
+
+# Salida de los detectores originales (uno por campo, línea a línea) sobre las mismas líneas OCR
+BASELINE = [
+    (["RESTAURANT EL POLLO SAC", "RUC: 20601234567", "FACTURA ELECTRONICA", "F001-00012345", "Fecha: 15/03/2024", "1 Pollo 25,50", "SUBTOTAL 21.61", "IGV 3.89", "TOTAL S/ 25.50", "Gracias"],
+     ("factura", "RESTAURANT EL POLLO SAC", "20601234567", "2024-03-15", "25.50", "PEN", "alimentación", "F001-00012345")),
+    (["Tienda", "ruc 10456789012", "boleta b002-123456", "2024-01-31 10:22", "Item 1.234,56", "Item 999.99", "USD"],
+     ("boleta", "Tienda", "10456789012", "2024-01-31", "999.99", "USD", "", "B002-123456")),
+    (["  hola   mundo  ", "", "taxi uber", "001-12345", "monto 12.5", "3.00 4.00"],
+     ("", "", "", "", "4.00", "", "transporte", "001-12345")),
+    (["netflix.com", "US$ 15.99", "TOTAL 15.99 16.00", "total 1.00"],
+     ("", "", "", "", "1.00", "USD", "entretenimiento", "")),
+    ([],
+     ("", "", "", "", "", "", "", "")),
+    (["CASA BONITA", "x" * 30, "RUC: 20123456789", "A123-4567890 F001-1234", "x F002-12345"],
+     ("", "CASA BONITA", "20123456789", "", "", "", "", "A123-4567890")),
+    (["TOTAL", "12.00", "farmacia salud", "S/ 3.50 total", "F001-12345 A123-45678", "31-12-2025", "2025/01/02"],
+     ("", "farmacia salud", "", "2025-12-31", "3.50", "PEN", "salud", "F001-12345")),
+    (["laptop", "pc", "Total a pagar", "cine 10.00"] + ["linea %d 1.%02d" % (i, i) for i in range(40)],
+     ("", "", "", "", "10.00", "", "entretenimiento", "")),
+    (["TOTAL 0.00", "item 5.00"],
+     ("", "", "", "", "0.00", "", "", "")),
+    (["total 007,05"],
+     ("", "", "", "", "7.05", "", "", "")),
+    (["TOTAL", "x"],
+     ("", "", "", "", "", "", "", "")),
+    # RapidOCR pega la etiqueta al valor
+    (["RUC20100070970", "TOTALS/25.00"],
+     ("", "", "20100070970", "", "25.00", "PEN", "", "")),
+    (["N°RUC20100070970 FECHA15/01/2024"],
+     ("", "", "20100070970", "2024-01-15", "", "", "", "")),
+    (["RUC 20100070970.50"],
+     ("", "", "20100070970", "", "20100070970.50", "", "", "")),
+]
+
+def fields(lines):
+    result = extract_fields(clean_text(lines))
+    return tuple(result[k] for k in FIELDS)
+
+class BaselineTest(unittest.TestCase):
+    def test_matches_baseline(self):
+        for lines, expected in BASELINE:
+            with self.subTest(lines=lines[:3]):
+                self.assertEqual(fields(lines), expected)
+
+    def test_intentional_differences(self):
+        # Corridas de más de 11 dígitos no son RUC (antes se tomaban los 11 primeros)
+        self.assertEqual(fields(["RUC 123456789012", "1.2320100070970"])[2], "")
+        # Montos en centavos enteros: sin redondeo de float
+        self.assertEqual(fields(["99999999999999.99 TOTAL"])[2:5], ("", "", "99999999999999.99"))
+
+class ConfidenceTest(unittest.TestCase):
+    def test_ruc_checksum(self):
+        self.assertTrue(ruc_valid("20100070970"))
+        self.assertTrue(ruc_valid("10467793549"))
+        self.assertFalse(ruc_valid("20100070971"))
+        self.assertFalse(ruc_valid("30100070970"))
+        self.assertFalse(ruc_valid(""))
+
+    def test_clean_receipt_is_confident(self):
+        lines = ["RESTAURANTE EL SOL SAC", "RUC 20100070970", "FACTURA F001-00012345", "FECHA 12/03/2024", "TOTAL S/ 45.50"]
+        self.assertEqual(extract_fields(lines)["confidence"], 1.0)
+
+    def test_invalid_ruc_scores_zero(self):
+        lines = ["CASA DEL PAN", "RUC: 20100070971", "Fecha 15/01/2024", "B001-12345", "EFECTIVO 100.00"]
+        self.assertEqual(extract_fields(lines)["confidence"], 0.0)
+
+    def test_max_amount_fallback_gets_no_credit(self):
+        # Sin número y con el efectivo entregado como único total posible
+        lines = ["MI TIENDA", "RUC 20100070970", "2024-01-15", "VUELTO 5.00 PAGO 100.00"]
+        result = extract_fields(lines)
+        self.assertEqual(result["monto_total"], "100.00")
+        self.assertLess(result["confidence"], 0.8)
+
+    def test_total_is_mandatory(self):
+        # RUC, fecha, número y proveedor válidos, pero sin un total > 0 en una línea TOTAL
+        head = ["MI TIENDA SAC", "RUC 20100070970", "2024-01-15", "B001-12345"]
+        for tail, total in ((["EFECTIVO 100.00"], "100.00"), (["TOTAL DESCUENTOS 0.00"], "0.00"), ([], "")):
+            with self.subTest(tail=tail):
+                result = extract_fields(head + tail)
+                self.assertEqual(result["numero_documento"], "B001-12345")
+                self.assertEqual(result["monto_total"], total)
+                self.assertEqual(result["confidence"], 0.0)
+
+    def test_total_line_with_document_number(self):
+        lines = ["MI TIENDA SAC", "RUC 20100070970", "2024-01-15", "B001-12345", "TOTAL 58.40", "EFECTIVO 100.00"]
+        result = extract_fields(lines)
+        self.assertEqual(result["monto_total"], "58.40")
+        self.assertEqual(result["confidence"], 1.0)
+
+    def test_line_before_ruc_is_not_scored(self):
+        # Sin fecha: con la razón social reconocida llega a 0.8, con "la línea antes del RUC" no
+        tail = ["RUC 20100070970", "B001-12345", "TOTAL 58.40"]
+        self.assertEqual(extract_fields(["MI TIENDA SAC"] + tail)["confidence"], 0.8)
+        result = extract_fields(["MI TIENDA"] + tail)
+        self.assertEqual(result["proveedor"], "MI TIENDA")
+        self.assertEqual(result["confidence"], 0.6)
+
+if __name__ == "__main__":
+    unittest.main()
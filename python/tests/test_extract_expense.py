@@ -0,0 +1,19 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extract_expense import row_text  # noqa: E402
+
+BOX = [[0, 0], [10, 0], [10, 10], [0, 10]]
+
+class RowTextTest(unittest.TestCase):
+    def test_rapidocr_row(self):
+        self.assertEqual(row_text([BOX, "TOTAL S/ 25.50", 0.98]), "TOTAL S/ 25.50")
+
+    def test_paddleocr_row(self):
+        self.assertEqual(row_text([BOX, ("TOTAL S/ 25.50", 0.98)]), "TOTAL S/ 25.50")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -20,4 +20,10 @@ export const config = {
   flowMonthlyPlan: process.env.FLOW_PLAN_MONTH_ID || 'contapro-month',
   flowAnnualPlan: process.env.FLOW_PLAN_YEAR_ID || 'contapro-year',
   flowForcePayment: String(process.env.FLOW_FORCE_PAYMENT || '').toLowerCase() === 'true',
+  pythonOcrPoolSize: Number(process.env.PYTHON_OCR_POOL_SIZE || 1),
+  pythonLlmPoolSize: Number(process.env.PYTHON_LLM_POOL_SIZE || 2),
+  pythonTimeoutMs: Number(process.env.PYTHON_TIMEOUT_MS || 120000),
+  llmImageMaxSide: Number(process.env.LLM_IMAGE_MAX_SIDE || 1024),
+  ocrConfidenceThreshold: Number(process.env.OCR_CONFIDENCE_THRESHOLD || 0.8),
+  ocrLlmDeadlineMs: Number(process.env.OCR_LLM_DEADLINE_MS || 2000),
 };
\ No newline at end of file
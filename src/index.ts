@@ -9,6 +9,7 @@ import oauth2 from '@fastify/oauth2';
 import jwt from '@fastify/jwt';
 import { config } from './config.js';
 import { prisma } from './plugins/prisma.js';
+import { pythonWorkers } from './plugins/pythonWorkers.js';
 import { authRoutes } from './routes/auth.js';
 import { historyRoutes } from './routes/history.js';
 import { uploadRoutes } from './routes/upload.js';
@@ -43,6 +44,7 @@ async function buildServer() {
 
   // Plugins
   await fastify.register(prisma);
+  await fastify.register(pythonWorkers);
 
   // Google OAuth2 (opcional, requiere credenciales)
   try {
@@ -0,0 +1,12 @@
+import fp from 'fastify-plugin';
+import { closePythonOCR } from '../services/pythonOCR.js';
+import { closePythonLLM } from '../services/pythonLLM.js';
+
+// The OCR/LLM worker pools are created lazily on the first document (after listen, when hooks can no
+// longer be added), so the shutdown hook is registered here at boot and closes whichever pools exist.
+export const pythonWorkers = fp(async (fastify) => {
+  fastify.addHook('onClose', async () => {
+    closePythonOCR();
+    closePythonLLM();
+  });
+});
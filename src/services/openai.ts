@@ -2,7 +2,7 @@ import OpenAI from 'openai';
 import crypto from 'node:crypto';
 import type { FastifyInstance } from 'fastify';
 import { config } from '../config.js';
-import { runPythonOCR } from './pythonOCR.js';
+import { runPythonOCR, type PyOcrResult } from './pythonOCR.js';
 import { runPythonLLM } from './pythonLLM.js';
 
 export function createOpenAI(app: FastifyInstance) {
@@ -87,15 +87,47 @@ Devuelve solo el JSON final sin texto adicional, encabezados ni explicaciones.`;
         items: null,
         observaciones: `Documento ${meta.filename} (${meta.mimeType}), tamaño ${meta.size} bytes`,
       };
-      // Forzar uso de LLM en Python siempre que haya imagen
+      // OCR primero: si sus campos críticos son verificables (RUC con dígito verificador, fecha, número,
+      // total y proveedor) no se paga la llamada al LLM. Sólo se le espera OCR_LLM_DEADLINE_MS; si tarda más
+      // (cola del pool, imagen grande) el LLM arranca igual y el OCR queda como fallback.
+      const ocrPromise = fileBuffer ? runPythonOCR(app, fileBuffer, meta.mimeType) : null;
+      let py: PyOcrResult = null;
+      let ocrDone = false;
+      if (ocrPromise) {
+        let timer: NodeJS.Timeout | undefined;
+        const deadline = new Promise<'timeout'>((resolve) => { timer = setTimeout(() => resolve('timeout'), config.ocrLlmDeadlineMs); });
+        const early = await Promise.race([ocrPromise, deadline]);
+        clearTimeout(timer);
+        if (early !== 'timeout') {
+          py = early;
+          ocrDone = true;
+        }
+      }
+      const ocrConfident = !!py && typeof py.confidence === 'number' && py.confidence >= config.ocrConfidenceThreshold;
+      if (py && ocrConfident) {
+        result = {
+          tipo_documento: py.tipo_documento || result.tipo_documento,
+          proveedor: py.proveedor,
+          ruc_proveedor: py.ruc_proveedor,
+          fecha_emision: py.fecha_emision,
+          monto_total: py.monto_total,
+          moneda: py.moneda || 'PEN',
+          categoria_gasto: py.categoria_gasto,
+          numero_documento: py.numero_documento,
+          items: null,
+          observaciones: py.text ? `OCR: ${py.text.slice(0, 400)}` : '',
+        };
+      }
+
+      // Forzar uso de LLM en Python siempre que haya imagen (salvo que el OCR ya sea suficiente)
       const usePythonLLM = true;
-      if (usePythonLLM && fileBuffer) {
+      if (usePythonLLM && fileBuffer && !ocrConfident) {
         const pyRes = await runPythonLLM(app, fileBuffer, meta.mimeType);
         if (pyRes) result = pyRes;
       }
 
       // Si no estamos usando Python, intentar con cliente Node
-      if (!usePythonLLM) {
+      if (!usePythonLLM && !ocrConfident) {
       try {
         // Build multimodal message when file buffer is provided
         let messages: any[];
@@ -164,8 +196,8 @@ Devuelve solo el JSON final sin texto adicional, encabezados ni explicaciones.`;
           isEmpty(result?.numero_documento) || isUnknown(result?.numero_documento)
         )
       );
-      if (needFallback && fileBuffer) {
-        const py = await runPythonOCR(app, fileBuffer, meta.mimeType);
+      if (needFallback && ocrPromise) {
+        if (!ocrDone) py = await ocrPromise;
         if (py) {
           // Merge conservador: sólo rellenar campos vacíos
           if ((isEmpty(result.proveedor) || isUnknown(result.proveedor)) && py.proveedor) result.proveedor = py.proveedor;
@@ -0,0 +1,163 @@
+import type { FastifyInstance } from 'fastify';
+import fs from 'node:fs/promises';
+import path from 'node:path';
+import readline from 'node:readline';
+import { spawn, type ChildProcessWithoutNullStreams } from 'node:child_process';
+
+export async function resolvePythonCmd(): Promise<string> {
+  const isWin = process.platform === 'win32';
+  const pythonEnv = process.env.PYTHON_CMD?.trim();
+  const defaultVenv = path.join(
+    process.cwd(),
+    'python',
+    '.venv',
+    isWin ? 'Scripts' : 'bin',
+    isWin ? 'python.exe' : 'python'
+  );
+  let pythonCmd: string;
+  if (pythonEnv) {
+    if (pythonEnv === 'python' || pythonEnv === 'python3' || pythonEnv === 'py') {
+      pythonCmd = pythonEnv;
+    } else {
+      const candidate = path.isAbsolute(pythonEnv) ? pythonEnv : path.join(process.cwd(), pythonEnv);
+      try {
+        await fs.access(candidate);
+        pythonCmd = candidate;
+      } catch {
+        // Si el candidato no existe (p.ej. ruta de Docker /app/...), usar venv por defecto local
+        pythonCmd = defaultVenv;
+        try { await fs.access(pythonCmd); } catch { pythonCmd = isWin ? 'py' : 'python'; }
+      }
+    }
+  } else {
+    pythonCmd = defaultVenv;
+    try { await fs.access(pythonCmd); } catch { pythonCmd = isWin ? 'py' : 'python'; }
+  }
+  return pythonCmd;
+}
+
+type Job = {
+  id: number;
+  path: string;
+  deadline: number;
+  resolve: (reply: Record<string, unknown> | null) => void;
+  timer?: NodeJS.Timeout;
+};
+
+type Worker = {
+  child: ChildProcessWithoutNullStreams;
+  job: Job | null;
+};
+
+// Pool of long-running Python processes started with CONTAPRO_DAEMON=1.
+// Each worker reads one {"id", "path", "timeout_ms"} JSON request per stdin line and answers with one JSON line that
+// echoes the id, so models and clients are loaded once per process instead of once per document.
+// Replies whose id does not match the worker's current job (stray prints from libraries) are dropped.
+export class PythonWorkerPool {
+  private app: FastifyInstance;
+  private script: string;
+  private size: number;
+  private timeoutMs: number;
+  private pythonCmd: Promise<string> | null = null;
+  private workers: Worker[] = [];
+  private queue: Job[] = [];
+  private nextId = 1;
+
+  constructor(app: FastifyInstance, script: string, size: number, timeoutMs: number) {
+    this.app = app;
+    this.script = script;
+    this.size = Number.isFinite(size) && size >= 1 ? Math.floor(size) : 1;
+    this.timeoutMs = Number.isFinite(timeoutMs) && timeoutMs > 0 ? timeoutMs : 120000;
+  }
+
+  // Resolves with the worker's JSON reply (without the echoed id), or null on timeout/crash.
+  // The timeout counts from enqueue, so time spent waiting for a free worker is included.
+  async run(filePath: string): Promise<Record<string, unknown> | null> {
+    if (!this.pythonCmd) this.pythonCmd = resolvePythonCmd();
+    const pythonCmd = await this.pythonCmd;
+    return new Promise((resolve) => {
+      const job: Job = { id: this.nextId++, path: filePath, deadline: Date.now() + this.timeoutMs, resolve };
+      job.timer = setTimeout(() => this.expire(job), this.timeoutMs);
+      this.queue.push(job);
+      this.dispatch(pythonCmd);
+    });
+  }
+
+  close() {
+    for (const job of this.queue.splice(0)) {
+      clearTimeout(job.timer);
+      job.resolve(null);
+    }
+    for (const w of this.workers) w.child.kill();
+  }
+
+  private expire(job: Job) {
+    this.app.log.warn({ msg: 'python worker timeout', script: this.script });
+    const queued = this.queue.indexOf(job);
+    if (queued >= 0) {
+      this.queue.splice(queued, 1);
+      job.resolve(null);
+      return;
+    }
+    // In flight: killing the worker resolves the job with null through its exit handler
+    this.workers.find((w) => w.job === job)?.child.kill();
+  }
+
+  private dispatch(pythonCmd: string) {
+    while (this.queue.length) {
+      let worker = this.workers.find((w) => !w.job);
+      if (!worker) {
+        if (this.workers.length >= this.size) return;
+        worker = this.spawnWorker(pythonCmd);
+      }
+      const job = this.queue.shift()!;
+      worker.job = job;
+      // timeout_ms: what is left of the job's deadline, so the script can fit its own retries inside it
+      const timeoutMs = Math.max(0, job.deadline - Date.now());
+      worker.child.stdin.write(JSON.stringify({ id: job.id, path: job.path, timeout_ms: timeoutMs }) + '\n');
+    }
+  }
+
+  private spawnWorker(pythonCmd: string): Worker {
+    this.app.log.info({ msg: 'python worker: spawning', pythonCmd, script: this.script });
+    const child = spawn(pythonCmd, [this.script], {
+      stdio: ['pipe', 'pipe', 'pipe'],
+      cwd: process.cwd(),
+      env: { ...process.env, CONTAPRO_DAEMON: '1' },
+    });
+    const worker: Worker = { child, job: null };
+    this.workers.push(worker);
+
+    const finish = (reply: Record<string, unknown> | null) => {
+      const job = worker.job;
+      worker.job = null;
+      if (job) {
+        clearTimeout(job.timer);
+        job.resolve(reply);
+      }
+      this.dispatch(pythonCmd);
+    };
+
+    readline.createInterface({ input: child.stdout }).on('line', (line) => {
+      let reply: any;
+      try { reply = JSON.parse(line); } catch { reply = null; }
+      if (!reply || typeof reply !== 'object' || !worker.job || reply.id !== worker.job.id) {
+        this.app.log.warn({ msg: 'python worker: ignoring unexpected stdout line', script: this.script, line: line.slice(0, 200) });
+        return;
+      }
+      delete reply.id;
+      finish(reply);
+    });
+    child.stderr.on('data', (d) => this.app.log.debug({ msg: 'python worker stderr', err: String(d) }));
+    child.stdin.on('error', () => {});
+    const onExit = (reason: unknown) => {
+      if (!this.workers.includes(worker)) return;
+      this.workers = this.workers.filter((w) => w !== worker);
+      this.app.log.warn({ msg: 'python worker exited', script: this.script, reason: String(reason) });
+      finish(null);
+    };
+    child.on('exit', (code) => onExit(code));
+    child.on('error', (e) => onExit(e));
+    return worker;
+  }
+}
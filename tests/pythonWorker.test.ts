@@ -0,0 +1,66 @@
+import { describe, it, expect, beforeAll, afterEach } from 'vitest';
+import fs from 'node:fs/promises';
+import os from 'node:os';
+import path from 'node:path';
+import type { FastifyInstance } from 'fastify';
+import { PythonWorkerPool } from '../src/services/pythonWorker';
+
+// Fake daemon: prints stray lines around each reply; "slow" requests never answer in time
+const SCRIPT = `
+import json, sys, time
+print("banner from some library", flush=True)
+for line in sys.stdin:
+    req = json.loads(line)
+    if req["path"] == "slow":
+        time.sleep(10)
+    print("progress 100%", flush=True)
+    print(json.dumps({"id": req["id"] + 1000, "path": "wrong"}), flush=True)
+    print(json.dumps({"id": req["id"], "path": req["path"]}), flush=True)
+`;
+
+const app = { log: { info() {}, warn() {}, debug() {} } } as unknown as FastifyInstance;
+
+describe('PythonWorkerPool', () => {
+  let script: string;
+  const pools: PythonWorkerPool[] = [];
+  const makePool = (size: number, timeoutMs: number) => {
+    const pool = new PythonWorkerPool(app, script, size, timeoutMs);
+    pools.push(pool);
+    return pool;
+  };
+
+  beforeAll(async () => {
+    process.env.PYTHON_CMD = 'python3';
+    const dir = await fs.mkdtemp(path.join(os.tmpdir(), 'pyworker-'));
+    script = path.join(dir, 'daemon.py');
+    await fs.writeFile(script, SCRIPT);
+  });
+
+  afterEach(() => {
+    for (const pool of pools.splice(0)) pool.close();
+  });
+
+  it('matches replies to requests by id despite stray output', async () => {
+    const pool = makePool(2, 10000);
+    const paths = ['a.png', 'b.png', 'c.png', 'd.png', 'e.png'];
+    const replies = await Promise.all(paths.map((p) => pool.run(p)));
+    expect(replies).toEqual(paths.map((p) => ({ path: p })));
+  });
+
+  it('counts the timeout from enqueue, including time waiting for a worker', async () => {
+    const pool = makePool(1, 500);
+    const started = Date.now();
+    const [slow, queued] = await Promise.all([pool.run('slow'), pool.run('queued.png')]);
+    expect(slow).toBeNull();
+    expect(queued).toBeNull();
+    expect(Date.now() - started).toBeLessThan(2000);
+    // The killed worker is replaced on the next request
+    expect(await pool.run('after.png')).toEqual({ path: 'after.png' });
+  });
+
+  it('falls back to a single worker for a non-numeric size', async () => {
+    const pool = makePool(Number('abc'), 10000);
+    await Promise.all(['a.png', 'b.png', 'c.png'].map((p) => pool.run(p)));
+    expect((pool as any).workers.length).toBe(1);
+  });
+});